@@ -7,6 +7,16 @@ import stat
 import zipfile
 import io
 import tempfile
+import sqlite3
+import threading
+import argparse
+import cProfile
+import pstats
+import tracemalloc
+import random
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(SCRIPT_DIR)
@@ -14,16 +24,47 @@ os.chdir(SCRIPT_DIR)
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def is_hidden(path):
+# Durability of raw PUT uploads: 'none' leaves flushing to the OS, 'file' fsyncs each
+# file before it is renamed into place, 'periodic' also fsyncs every UPLOAD_FSYNC_INTERVAL bytes.
+UPLOAD_FSYNC = 'none'
+UPLOAD_FSYNC_INTERVAL = 64 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB read buffer, reused for the whole upload
+
+# The umask can only be read by setting it, so read it once at startup
+_umask = os.umask(0)
+os.umask(_umask)
+
+# Number of threads used to scan directories in parallel. Higher values help on
+# network mounts (NFS/SMB) and spinning disks where each readdir/stat is slow.
+WALK_WORKERS = 16
+_walk_executor = ThreadPoolExecutor(max_workers=WALK_WORKERS, thread_name_prefix='walk')
+
+# Optional on-disk metadata catalog (enable with --catalog). It lives in a hidden
+# folder so it stays out of listings, and so SQLite creating and removing its
+# -wal/-shm files only changes that folder's mtime, not the server root's.
+DEFAULT_CATALOG_PATH = os.path.join('.catalog', 'catalog.sqlite3')
+CATALOG_RECONCILE_INTERVAL = 300  # seconds between background reconciles
+CATALOG_WORKERS = 4  # scan threads for reconciling, separate from the walk pool used by requests
+catalog = None
+
+# Opt-in request profiling (enable with --profile-rate). Sampled requests slower than
+# PROFILE_SLOW_MS are kept, the newest PROFILE_KEEP of them.
+PROFILE_SLOW_MS = 500
+PROFILE_KEEP = 20
+request_profiler = None
+
+def is_hidden(path, file_stat=None):
     """Check if a file or directory is hidden.
     On Windows, checks the FILE_ATTRIBUTE_HIDDEN attribute.
     On Unix-like systems, checks if the name starts with '.'.
+    Pass file_stat if the path has already been stat'ed to avoid another stat call.
     """
     if os.path.basename(path).startswith('.'):
         return True
     
     try:
-        file_stat = os.stat(path)
+        if file_stat is None:
+            file_stat = os.stat(path)
         if hasattr(file_stat, 'st_file_attributes'):
             if file_stat.st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN:
                 return True
@@ -32,36 +73,435 @@ def is_hidden(path):
     
     return False
 
-def get_folder_size(folder_path):
-    """Calculate the total size of a folder recursively.
-    Returns the size in bytes.
+def is_excluded(path, file_stat=None):
+    """Check if a directory entry should be left out of listings, sizes and ZIPs.
+    Hidden entries and the 'uploads' and 'assets' folders are excluded.
     """
-    total_size = 0
+    name = os.path.basename(path)
+    return name == 'uploads' or name == 'assets' or is_hidden(path, file_stat)
+
+def _scan_dir(dirpath):
+    """Read one directory and stat its entries.
+    Returns (dirpath, dirnames, files, subdirs) where files is a list of
+    (filename, size) tuples and subdirs are the directories to descend into.
+    """
+    dirnames = []
+    files = []
+    subdirs = []
     try:
-            for dirpath, dirnames, filenames in os.walk(folder_path):
-                # Filter out hidden directories and 'uploads' folder
-                dirnames[:] = [d for d in dirnames if not is_hidden(os.path.join(dirpath, d)) and d != 'uploads' and d != 'assets']
-            
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
                 try:
-                    if not is_hidden(filepath):
-                        total_size += os.path.getsize(filepath)
+                    # Check the name before stat'ing so dotfiles cost no round trip,
+                    # then stat each entry once for both the hidden check and the size
+                    if entry.name.startswith('.'):
+                        continue
+                    entry_stat = entry.stat()
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        if is_excluded(entry.path, entry_stat):
+                            continue
+                        dirnames.append(entry.name)
+                        # Like os.walk, don't follow symlinked directories
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif not is_hidden(entry.path, entry_stat):
+                        files.append((entry.name, entry_stat.st_size))
                 except (OSError, ValueError):
-                    # Skip files that can't be accessed
+                    # Skip entries that can't be accessed
                     continue
     except (OSError, PermissionError):
-        # Return 0 if folder can't be accessed
+        # Skip directories that can't be read
         pass
+    return dirpath, dirnames, files, subdirs
+
+def walk_tree(*tops):
+    """Walk one or more directory trees, scanning directories in parallel on the walk pool.
+    Yields (dirpath, dirnames, files) as each directory finishes scanning, where
+    files is a list of (filename, size) tuples. Hidden entries and the 'uploads'
+    and 'assets' folders are skipped. Order is not guaranteed.
+    """
+    pending = {_walk_executor.submit(_scan_dir, top) for top in tops}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirpath, dirnames, files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(_walk_executor.submit(_scan_dir, subdir))
+                yield dirpath, dirnames, files
+    finally:
+        # Caller stopped early: drop directories that haven't started scanning yet
+        for future in pending:
+            future.cancel()
+
+def get_folder_size(folder_path):
+    """Calculate the total size of a folder recursively.
+    Returns the size in bytes.
+    """
+    if catalog is not None:
+        rel_path = os.path.relpath(os.path.abspath(folder_path), SCRIPT_DIR).replace('\\', '/')
+        if not rel_path.startswith('..'):
+            size = catalog.folder_size(rel_path)
+            if size is not None:
+                return size
     
+    total_size = 0
+    for dirpath, dirnames, files in walk_tree(folder_path):
+        for filename, file_size in files:
+            total_size += file_size
     return total_size
 
+class MetadataCatalog:
+    """Persistent sqlite3 catalog of paths, sizes and mtimes under the server root.
+    Listings and folder sizes are answered from the last committed reconcile while
+    a background thread re-syncs the catalog by comparing directory mtimes; only
+    directories whose mtime changed are re-read. Since folder sizes aggregate whole
+    subtrees, queries stat every cataloged directory under the folder they answer
+    for and return None if any changed since the last reconcile, so callers fall
+    back to a live scan rather than serve stale contents. A file rewritten in place
+    does not change its directory's mtime, so its new size shows up on the next
+    change there.
+    Paths are stored relative to the root with '/' separators, the root being '.'.
+    """
+    def __init__(self, db_path, root):
+        self.db_path = db_path
+        self.root = root
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Reconciles scan on their own pool so they don't queue ahead of request-time walks
+        self._executor = ThreadPoolExecutor(max_workers=CATALOG_WORKERS, thread_name_prefix='catalog-scan')
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Readers get their own connection so they only ever see committed reconciles
+        self._db = self._connect()
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+            CREATE TABLE IF NOT EXISTS entries (
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                PRIMARY KEY (parent, name)
+            );
+        ''')
+        self._db.commit()
+    
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+    
+    @staticmethod
+    def _join(parent, name):
+        return name if parent == '.' else parent + '/' + name
+    
+    def _is_current(self, rel_path, mtime):
+        # True if the directory still has the mtime recorded at the last reconcile
+        try:
+            return os.stat(os.path.join(self.root, rel_path)).st_mtime == mtime
+        except OSError:
+            return False
+    
+    def _subtree_is_current(self, rel_path):
+        # True if rel_path is cataloged and neither it nor any directory below it changed.
+        # The stats run on the walk pool - still far cheaper than re-reading the directories.
+        with self._lock:
+            if rel_path == '.':
+                dirs = self._db.execute('SELECT path, mtime FROM dirs').fetchall()
+            else:
+                prefix = rel_path + '/'
+                dirs = self._db.execute('SELECT path, mtime FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?',
+                                        (rel_path, len(prefix), prefix)).fetchall()
+        if not any(path == rel_path for path, mtime in dirs):
+            return False
+        return all(_walk_executor.map(lambda d: self._is_current(*d), dirs))
+    
+    def start(self):
+        """Start reconciling in the background: once now, then every CATALOG_RECONCILE_INTERVAL seconds."""
+        self._thread = threading.Thread(target=self._run, name='catalog', daemon=True)
+        self._thread.start()
+    
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown()
+        with self._lock:
+            self._db.close()
+    
+    def _run(self):
+        db = self._connect()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.reconcile(db)
+                except sqlite3.Error as e:
+                    print(f"Catalog reconcile failed: {e}")
+                self._stop.wait(CATALOG_RECONCILE_INTERVAL)
+        finally:
+            db.close()
+    
+    def _scan(self, rel_path, known_mtime):
+        # Runs on the walk pool. Returns (rel_path, mtime, scan) where mtime is None
+        # if the directory is gone and scan is None if it is unchanged since last time.
+        abs_path = os.path.join(self.root, rel_path)
+        try:
+            mtime = os.stat(abs_path).st_mtime
+        except OSError:
+            return rel_path, None, None
+        if mtime == known_mtime:
+            return rel_path, mtime, None
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(abs_path) as it:
+                for entry in it:
+                    try:
+                        if entry.name.startswith('.'):
+                            continue
+                        entry_stat = entry.stat()
+                        if is_excluded(entry.path, entry_stat):
+                            continue
+                        if stat.S_ISDIR(entry_stat.st_mode):
+                            entries.append((entry.name, 'folder', 0, entry_stat.st_mtime))
+                            if not entry.is_symlink():
+                                subdirs.append(entry.name)
+                        else:
+                            entries.append((entry.name, 'file', entry_stat.st_size, entry_stat.st_mtime))
+                    except (OSError, ValueError):
+                        continue
+        except (OSError, PermissionError):
+            pass
+        return rel_path, mtime, (entries, subdirs)
+    
+    def reconcile(self, db):
+        """Bring the catalog in line with the filesystem and commit it in one transaction."""
+        known = dict(db.execute('SELECT path, mtime FROM dirs'))
+        seen = set()
+        pending = {self._executor.submit(self._scan, '.', known.get('.'))}
+        while pending:
+            if self._stop.is_set():
+                # Shutting down: abandon this reconcile and keep the last committed catalog
+                for future in pending:
+                    future.cancel()
+                db.rollback()
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_path, mtime, scan = future.result()
+                if mtime is None:
+                    continue
+                seen.add(rel_path)
+                if scan is None:
+                    subdirs = [os.path.basename(p) for p, in db.execute(
+                        'SELECT path FROM dirs WHERE parent = ?', (rel_path,))]
+                else:
+                    entries, subdirs = scan
+                    parent = None if rel_path == '.' else (os.path.dirname(rel_path) or '.')
+                    db.execute('INSERT OR REPLACE INTO dirs (path, parent, mtime, size) VALUES (?, ?, ?, 0)',
+                               (rel_path, parent, mtime))
+                    db.execute('DELETE FROM entries WHERE parent = ?', (rel_path,))
+                    db.executemany('INSERT INTO entries (parent, name, type, size, mtime) VALUES (?, ?, ?, ?, ?)',
+                                   [(rel_path,) + entry for entry in entries])
+                for name in subdirs:
+                    child = self._join(rel_path, name)
+                    pending.add(self._executor.submit(self._scan, child, known.get(child)))
+        
+        for rel_path in set(known) - seen:
+            db.execute('DELETE FROM dirs WHERE path = ?', (rel_path,))
+            db.execute('DELETE FROM entries WHERE parent = ?', (rel_path,))
+        
+        # Aggregate folder sizes bottom-up, deepest directories first
+        totals = dict(db.execute("SELECT parent, SUM(size) FROM entries WHERE type = 'file' GROUP BY parent"))
+        parents = dict(db.execute('SELECT path, parent FROM dirs'))
+        sizes = {rel_path: totals.get(rel_path, 0) for rel_path in parents}
+        for rel_path in sorted(parents, key=lambda p: p.count('/') + (p != '.'), reverse=True):
+            parent = parents[rel_path]
+            if parent in sizes:
+                sizes[parent] += sizes[rel_path]
+        db.executemany('UPDATE dirs SET size = ? WHERE path = ?', [(size, p) for p, size in sizes.items()])
+        db.commit()
+    
+    def folder_size(self, rel_path):
+        """Return the aggregated size of a cataloged folder, or None if it isn't cataloged or anything in it changed."""
+        if not self._subtree_is_current(rel_path):
+            return None
+        with self._lock:
+            row = self._db.execute('SELECT size FROM dirs WHERE path = ?', (rel_path,)).fetchone()
+        return row[0] if row else None
+    
+    def list_folder(self, rel_path):
+        """Return the immediate children of a folder in /api/files format, or None if it isn't cataloged
+        or anything in it changed."""
+        if not self._subtree_is_current(rel_path):
+            return None
+        with self._lock:
+            entries = self._db.execute('SELECT name, type, size FROM entries WHERE parent = ?', (rel_path,)).fetchall()
+            folder_sizes = dict(self._db.execute('SELECT path, size FROM dirs WHERE parent = ?', (rel_path,)))
+        items = []
+        for name, entry_type, size in entries:
+            path = self._join(rel_path, name)
+            if entry_type == 'folder':
+                size = folder_sizes.get(path)
+                if size is None:
+                    # Symlinked folders aren't cataloged, so size them live
+                    size = get_folder_size(os.path.join(self.root, path))
+            items.append({'path': path, 'name': name, 'type': entry_type, 'size': size})
+        return items
+    
+    def list_all_files(self):
+        """Return every cataloged file in recursive /api/files format, or None if nothing is cataloged yet
+        or anything changed."""
+        if not self._subtree_is_current('.'):
+            return None
+        with self._lock:
+            rows = self._db.execute("SELECT parent, name, size FROM entries WHERE type = 'file'").fetchall()
+        files = [{
+            'path': self._join(parent, name),
+            'name': name,
+            'size': size,
+            'directory': '.' if parent == '.' else './' + parent
+        } for parent, name, size in rows]
+        files.sort(key=lambda x: x['path'])
+        return files
+
+class RequestProfiler:
+    """Samples a fraction of requests with cProfile and tracemalloc.
+    Samples slower than slow_ms are kept, the newest `keep` of them, and served by
+    /api/profiles; with save_dir they are also written there as .prof files.
+    cProfile only sees the handler thread, so time spent on the walk and catalog
+    pools shows up as waiting on futures. tracemalloc is process-wide, so the peak
+    and allocation sites also include other threads (e.g. a catalog reconcile)
+    running at the same time, and only one request is profiled at a time.
+    """
+    def __init__(self, rate, slow_ms=PROFILE_SLOW_MS, keep=PROFILE_KEEP, save_dir=None):
+        self.rate = rate
+        self.slow_ms = slow_ms
+        self.save_dir = save_dir
+        self.profiles = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        # Ids restart every run, so prefix saved files to keep earlier runs' files intact
+        self._run_id = time.strftime('%Y%m%d-%H%M%S')
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+    
+    @staticmethod
+    def route(command, path):
+        # Group requests by handler rather than by individual file
+        path = urllib.parse.urlparse(path).path
+        for prefix in ('/api/files', '/download/', '/upload/'):
+            if path.startswith(prefix):
+                return f"{command} {prefix}"
+        if path in ('/', '/index.html', ''):
+            return f"{command} /"
+        return f"{command} static"
+    
+    def should_sample(self):
+        return random.random() < self.rate
+    
+    def profile(self, handler, handle):
+        """Run handle(), the handler's do_* method for a parsed request, under cProfile and tracemalloc."""
+        if not self._lock.acquire(blocking=False):
+            # Another request is being profiled
+            return handle()
+        try:
+            profiler = cProfile.Profile()
+            tracemalloc.start()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return handle()
+            finally:
+                profiler.disable()
+                duration_ms = (time.perf_counter() - start) * 1000
+                peak = tracemalloc.get_traced_memory()[1]
+                if duration_ms >= self.slow_ms:
+                    snapshot = tracemalloc.take_snapshot().filter_traces([
+                        tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                    ])
+                    tracemalloc.stop()
+                    self.record(handler.command, handler.path, profiler, duration_ms, peak, snapshot)
+                else:
+                    tracemalloc.stop()
+        finally:
+            self._lock.release()
+    
+    def record(self, command, path, profiler, duration_ms, peak, snapshot):
+        profile_id = self._next_id
+        self._next_id += 1
+        stats_text = io.StringIO()
+        pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(40)
+        entry = {
+            'id': profile_id,
+            'route': self.route(command, path),
+            'path': path,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(duration_ms, 1),
+            'peak_memory': peak,
+            'top_allocations': [{
+                'site': f"{alloc.traceback[0].filename}:{alloc.traceback[0].lineno}",
+                'size': alloc.size,
+                'count': alloc.count
+            } for alloc in snapshot.statistics('lineno')[:10]],
+            'stats': stats_text.getvalue()
+        }
+        if self.save_dir:
+            route_name = re.sub(r'[^A-Za-z0-9]+', '_', entry['route']).strip('_')
+            entry['file'] = os.path.join(self.save_dir, f"{self._run_id}-{profile_id}-{route_name}.prof")
+            profiler.dump_stats(entry['file'])
+        if len(self.profiles) == self.profiles.maxlen and self.profiles[0].get('file'):
+            # Oldest profile is about to be dropped - remove its file too
+            try:
+                os.remove(self.profiles[0]['file'])
+            except OSError:
+                pass
+        self.profiles.append(entry)
+    
+    def summaries(self):
+        """Return the kept profiles, newest first, without the full stats text."""
+        return [{k: v for k, v in entry.items() if k != 'stats'} for entry in reversed(self.profiles)]
+    
+    def get(self, profile_id):
+        for entry in self.profiles:
+            if entry['id'] == profile_id:
+                return entry
+        return None
+
 class UploadHandler(SimpleHTTPRequestHandler):
+    def parse_request(self):
+        # Profile a sampled fraction of requests when --profile-rate is set. Wrapping the do_*
+        # method here keeps reading the request line (an idle connection) out of the timing.
+        if not super().parse_request():
+            return False
+        mname = 'do_' + self.command
+        method = getattr(self, mname, None)
+        if (request_profiler is not None and method is not None
+                and not self.path.startswith('/api/profiles') and request_profiler.should_sample()):
+            def profiled():
+                try:
+                    return request_profiler.profile(self, method)
+                finally:
+                    # Only this request is sampled, not later ones on the same connection
+                    delattr(self, mname)
+            setattr(self, mname, profiled)
+        return True
+    
     def do_OPTIONS(self):
         # Handle CORS preflight requests for range requests
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, PUT, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Range, Content-Type')
         self.send_header('Access-Control-Max-Age', '86400')
         self.end_headers()
@@ -73,6 +513,8 @@ class UploadHandler(SimpleHTTPRequestHandler):
         
         if path == '/api/files' or path == '/api/files/':
             self.send_file_list()
+        elif path.startswith('/api/profiles') and request_profiler is not None:
+            self.send_profiles(path)
         elif path.startswith('/download/'):
             self.send_file()
         elif path == '/' or path == '/index.html' or path == '':
@@ -308,46 +750,12 @@ class UploadHandler(SimpleHTTPRequestHandler):
                     self.wfile.write(error_response.encode())
                     return
                 
-                items = []
-                try:
-                    for item in os.listdir(folder_path):
-                        item_path = os.path.join(folder_path, item)
-                        
-                        if is_hidden(item_path) or item == 'uploads' or item == 'assets':
-                            continue
-                        
-                        rel_path = os.path.relpath(item_path, '.').replace('\\', '/')
-                        
-                        if os.path.isdir(item_path):
-                            try:
-                                folder_size = get_folder_size(item_path)
-                                items.append({
-                                    'path': rel_path,
-                                    'name': item,
-                                    'type': 'folder',
-                                    'size': folder_size
-                                })
-                            except (OSError, PermissionError):
-                                # If we can't calculate size, still add folder with 0 size
-                                items.append({
-                                    'path': rel_path,
-                                    'name': item,
-                                    'type': 'folder',
-                                    'size': 0
-                                })
-                        elif os.path.isfile(item_path):
-                            try:
-                                file_size = os.path.getsize(item_path)
-                                items.append({
-                                    'path': rel_path,
-                                    'name': item,
-                                    'type': 'file',
-                                    'size': file_size
-                                })
-                            except (OSError, ValueError):
-                                continue
-                except (OSError, PermissionError):
-                    pass
+                items = None
+                if catalog is not None:
+                    items = catalog.list_folder(os.path.relpath(abs_folder_path, server_root).replace('\\', '/'))
+                
+                if items is None:
+                    items = self.list_folder(folder_path)
                 
                 items.sort(key=lambda x: (x['type'] != 'folder', x['name'].lower()))
                 
@@ -359,34 +767,12 @@ class UploadHandler(SimpleHTTPRequestHandler):
                 return
             
             # Backward compatibility: Return all files recursively when no folder param specified
-            files = []
-            root_dir = '.'
+            files = None
+            if catalog is not None:
+                files = catalog.list_all_files()
             
-            for root, dirs, filenames in os.walk(root_dir):
-                filtered_dirs = []
-                for d in dirs:
-                    dir_path = os.path.join(root, d)
-                    if not is_hidden(dir_path) and d != 'uploads' and d != 'assets':
-                        filtered_dirs.append(d)
-                dirs[:] = filtered_dirs
-                
-                for filename in filenames:
-                    try:
-                        full_path = os.path.join(root, filename)
-                        
-                        if is_hidden(full_path):
-                            continue
-                        
-                        rel_path = os.path.relpath(full_path, root_dir).replace('\\', '/')
-                        file_size = os.path.getsize(full_path)
-                        files.append({
-                            'path': rel_path,
-                            'name': filename,
-                            'size': file_size,
-                            'directory': root.replace('\\', '/')
-                        })
-                    except (OSError, ValueError):
-                        continue
+            if files is None:
+                files = self.list_all_files()
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -400,6 +786,80 @@ class UploadHandler(SimpleHTTPRequestHandler):
             error_response = json.dumps({'error': str(e)})
             self.wfile.write(error_response.encode())
     
+    def send_profiles(self, path):
+        # Admin endpoint: /api/profiles lists kept slow-request profiles as JSON,
+        # /api/profiles/<id> returns the cProfile stats of one of them as text
+        profile_id = path[len('/api/profiles'):].strip('/')
+        if not profile_id:
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(request_profiler.summaries()).encode())
+            return
+        
+        entry = request_profiler.get(int(profile_id)) if profile_id.isdigit() else None
+        if entry is None:
+            self.send_error(404, "Profile not found")
+            return
+        content = entry['stats'].encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+    
+    def list_folder(self, folder_path):
+        # Scan the filesystem for the immediate children of a folder (used when the catalog can't answer).
+        # Child folder sizes come from the catalog where it has them; the rest are walked together
+        # so sibling subtrees are scanned in parallel too.
+        dirpath, dirnames, files, subdirs = _scan_dir(folder_path)
+        items = {}
+        to_walk = []
+        for name in dirnames:
+            rel_path = os.path.relpath(os.path.join(folder_path, name), '.').replace('\\', '/')
+            size = catalog.folder_size(rel_path) if catalog is not None else None
+            if size is None:
+                size = 0
+                to_walk.append(os.path.join(folder_path, name))
+            items[name] = {
+                'path': rel_path,
+                'name': name,
+                'type': 'folder',
+                'size': size
+            }
+        for name, file_size in files:
+            items[name] = {
+                'path': os.path.relpath(os.path.join(folder_path, name), '.').replace('\\', '/'),
+                'name': name,
+                'type': 'file',
+                'size': file_size
+            }
+        
+        for dirpath, dirnames, files in walk_tree(*to_walk):
+            # Add this directory's files to the size of the top-level child containing it
+            child = os.path.relpath(dirpath, folder_path).split(os.sep)[0]
+            items[child]['size'] += sum(file_size for name, file_size in files)
+        return list(items.values())
+    
+    def list_all_files(self):
+        # Scan the filesystem for every file under the server root (used when the catalog can't answer)
+        files = []
+        root_dir = '.'
+        
+        for root, dirs, filenames in walk_tree(root_dir):
+            for filename, file_size in filenames:
+                full_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(full_path, root_dir).replace('\\', '/')
+                files.append({
+                    'path': rel_path,
+                    'name': filename,
+                    'size': file_size,
+                    'directory': root.replace('\\', '/')
+                })
+        # walk_tree yields directories as they finish scanning; keep responses stable
+        files.sort(key=lambda x: x['path'])
+        return files
+    
     def send_file(self):
         # Handle file/folder downloads: Extract path from /download/ URL, validate security, and stream file or ZIP
         parsed_path = urllib.parse.urlparse(self.path)
@@ -437,22 +897,20 @@ class UploadHandler(SimpleHTTPRequestHandler):
                 zip_buffer = io.BytesIO()
                 folder_name = os.path.basename(filepath) or 'folder'
                 
+                # Walk through the folder and collect all files, sorted so ZIP entry order is stable
+                file_paths = sorted(os.path.join(root, file)
+                                    for root, dirs, files in walk_tree(filepath)
+                                    for file, file_size in files)
+                
                 with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                    # Walk through the folder and add all files
-                    for root, dirs, files in os.walk(filepath):
-                        # Filter out hidden directories and 'uploads' folder
-                        dirs[:] = [d for d in dirs if not is_hidden(os.path.join(root, d)) and d != 'uploads' and d != 'assets']
-                        
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            if not is_hidden(file_path):
-                                try:
-                                    # Get relative path from the folder being zipped
-                                    arcname = os.path.relpath(file_path, filepath)
-                                    zip_file.write(file_path, arcname)
-                                except (OSError, PermissionError):
-                                    # Skip files that can't be accessed
-                                    continue
+                    for file_path in file_paths:
+                        try:
+                            # Get relative path from the folder being zipped
+                            arcname = os.path.relpath(file_path, filepath)
+                            zip_file.write(file_path, arcname)
+                        except (OSError, PermissionError):
+                            # Skip files that can't be accessed
+                            continue
                 
                 zip_buffer.seek(0)
                 content = zip_buffer.read()
@@ -631,6 +1089,102 @@ class UploadHandler(SimpleHTTPRequestHandler):
             except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
                 # Connection closed while trying to send error - ignore
                 pass
+    def do_PUT(self):
+        # Route PUT requests: raw streaming uploads to /upload/<name>
+        path = urllib.parse.urlparse(self.path).path
+        if path.startswith('/upload/'):
+            self.receive_upload(urllib.parse.unquote(path[8:]))
+        else:
+            self.send_error(404, "Invalid upload path")
+    
+    def receive_upload(self, filename):
+        # Stream the raw request body into UPLOAD_DIR: write to a hidden temp file preallocated
+        # from Content-Length, fsync according to UPLOAD_FSYNC, then atomically rename into place
+        filename = os.path.basename(filename.replace('\\', '/'))
+        if not filename or filename.startswith('.'):
+            self.send_error(400, "Invalid file name")
+            return
+        
+        content_length = self.headers.get('Content-Length')
+        if content_length is None or not content_length.isdigit():
+            self.send_error(411, "Content-Length required")
+            return
+        content_length = int(content_length)
+        
+        # The server speaks HTTP/1.0, so the base handler never answers 'Expect: 100-continue'
+        # itself; without this, clients like curl -T wait about a second before sending the body
+        if self.headers.get('Expect', '').lower() == '100-continue':
+            self.send_response_only(100)
+            self.end_headers()
+        
+        fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if content_length > 0 and hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, content_length)
+                    except OSError:
+                        # Filesystem doesn't support preallocation - just write normally
+                        pass
+                
+                buffer = bytearray(UPLOAD_CHUNK_SIZE)
+                view = memoryview(buffer)
+                remaining = content_length
+                unsynced = 0
+                while remaining > 0:
+                    read_size = self.rfile.readinto(view[:min(UPLOAD_CHUNK_SIZE, remaining)])
+                    if not read_size:
+                        break
+                    f.write(view[:read_size])
+                    remaining -= read_size
+                    unsynced += read_size
+                    if UPLOAD_FSYNC == 'periodic' and unsynced >= UPLOAD_FSYNC_INTERVAL:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        unsynced = 0
+                
+                if remaining > 0:
+                    raise ConnectionAbortedError("Upload ended before Content-Length bytes were received")
+                if UPLOAD_FSYNC != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+                if hasattr(os, 'fchmod'):
+                    # mkstemp creates the file as 0600; give it the mode a normal open() would
+                    os.fchmod(f.fileno(), 0o666 & ~_umask)
+            
+            os.replace(temp_path, os.path.join(UPLOAD_DIR, filename))
+            if UPLOAD_FSYNC != 'none' and hasattr(os, 'O_DIRECTORY'):
+                # Make the rename itself durable
+                dir_fd = os.open(UPLOAD_DIR, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
+            # Client disconnected mid-upload - discard the partial file
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        except Exception as e:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            try:
+                self.send_error(500, f"Error: {str(e)}")
+            except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+                pass
+            return
+        
+        self.send_response(201)
+        self.end_headers()
+        try:
+            self.wfile.write(f"File '{filename}' uploaded successfully".encode())
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            pass
+    
     def do_POST(self):
         # Handle file uploads: Parse multipart/form-data, extract files, and save to uploads directory
         try:
@@ -728,6 +1282,41 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def fraction(value):
+    number = float(value)
+    if not 0 <= number <= 1:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 1, got {value}")
+    return number
+
+parser = argparse.ArgumentParser(description="Local File Explorer server")
+parser.add_argument('--catalog', nargs='?', const=DEFAULT_CATALOG_PATH, metavar='PATH',
+                    help=f"keep a persistent metadata catalog for fast warm startup (default path: {DEFAULT_CATALOG_PATH})")
+parser.add_argument('--upload-fsync', choices=['none', 'file', 'periodic'], default=UPLOAD_FSYNC,
+                    help="durability of PUT /upload/<name> uploads (default: %(default)s)")
+parser.add_argument('--profile-rate', type=fraction, default=0, metavar='FRACTION',
+                    help="profile this fraction of requests (0-1) and keep slow ones at /api/profiles")
+parser.add_argument('--profile-slow-ms', type=float, default=PROFILE_SLOW_MS, metavar='MS',
+                    help="keep sampled profiles of requests taking at least this long (default: %(default)s)")
+parser.add_argument('--profile-keep', type=positive_int, default=PROFILE_KEEP, metavar='N',
+                    help="number of slow-request profiles to keep (default: %(default)s)")
+parser.add_argument('--profile-dir', metavar='DIR',
+                    help="also save kept profiles as .prof files in this directory")
+args = parser.parse_args()
+UPLOAD_FSYNC = args.upload_fsync
+
+if args.profile_rate > 0:
+    request_profiler = RequestProfiler(args.profile_rate, args.profile_slow_ms, args.profile_keep, args.profile_dir)
+
+if args.catalog:
+    catalog = MetadataCatalog(args.catalog, SCRIPT_DIR)
+    catalog.start()
+
 server = HTTPServer(("0.0.0.0", 1313), UploadHandler)
 ip = get_local_ip()
 print(f"Local File Explorer server running at http://{ip}:1313")
@@ -737,3 +1326,5 @@ try:
 except KeyboardInterrupt:
     print("\nServer stopped.")
     server.server_close()
+    if catalog is not None:
+        catalog.close()